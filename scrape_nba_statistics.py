@@ -1,82 +1,162 @@
 import re
-import urllib
-from time import sleep
 import json
+import socket
+import asyncio
+import httpx
+import numpy as np
 import pandas as pd
 from itertools import chain
 
+# never hang a request on a stalled connection
+REQUEST_TIMEOUT = 10
+
+# Resolve each ESPN host once and hand the cached answer to every new
+# connection, so retries and extra connections in the pool don't repeat
+# the DNS round trip.
+_ESPN_HOSTS = ('www.espn.com', 'site.web.api.espn.com')
+_dns_cache = dict()
+_getaddrinfo = socket.getaddrinfo
+def _cached_getaddrinfo(host, *args, **kwargs):
+    if host in _ESPN_HOSTS:
+        if host not in _dns_cache:
+            _dns_cache[host] = _getaddrinfo(host, *args, **kwargs)
+        return _dns_cache[host]
+    return _getaddrinfo(host, *args, **kwargs)
+socket.getaddrinfo = _cached_getaddrinfo
+
+# orjson parses the embedded roster blob ~3x faster than stdlib json,
+# but the stdlib works fine if it isn't installed.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Compile the scraping regexes once at import instead of re-parsing the
+# pattern literals on every call.
+_TEAM_RE = re.compile("www\.espn\.com/nba/team/_/name/(\w+)/(.+?)\",")
+# Google's re2 compiles to a DFA, so matching the roster page stays linear
+# no matter how the pattern and input interact; fall back to the stdlib
+# engine when re2 isn't installed.
+try:
+    import re2 as _regex
+except ImportError:
+    _regex = re
+# the groups deliberately match runs of non-delimiter characters rather
+# than \w+\s\w+ and .*?, which missed names like "P.J. Tucker" or
+# "Karl-Anthony Towns" and backtracked badly under the stdlib NFA.
+_PLAYER_RE = _regex.compile(r'\{"name":"([^"<]{1,64})","href":"https?://www\.espn\.com/nba/player/[^"]*",([^}]*)\}')
+_ESPNFITT_RE = re.compile(r"window\['__espnfitt__'\]=(\{.*?\});</script>")
+
 # This method finds the urls for each of the rosters in the NBA using regexes.
-def build_team_urls():
+async def build_team_urls(client):
     # Open the espn teams webpage and extract the names of each roster available.
-    f = urllib.request.urlopen('https://www.espn.com/nba/teams')
-    teams_source = f.read().decode('utf-8')
-    teams = dict(re.findall("www\.espn\.com/nba/team/_/name/(\w+)/(.+?)\",", teams_source))
-    # Using the names of the rosters, create the urls of each roster
-    roster_urls = []
-    for key in teams.keys():
-        # each roster webpage follows this general pattern.
-        roster_urls.append('https://www.espn.com/nba/team/roster/_/name/' + key + '/' + teams[key])
-        teams[key] = str(teams[key])
-    return dict(zip(teams.values(), roster_urls))
+    teams_source = (await client.get('https://www.espn.com/nba/teams')).text
+    # each roster webpage follows this general pattern, so map the team
+    # name to its roster url in a single pass over the matches.
+    return {name: 'https://www.espn.com/nba/team/roster/_/name/' + abbrev + '/' + name
+            for abbrev, name in _TEAM_RE.findall(teams_source)}
+
+# ESPN embeds the whole roster as one JSON blob inside a script tag, so we
+# can parse it in a single pass instead of regexing out each player fragment
+# and re-parsing it with json.loads.
+def parse_roster_json(roster_source):
+    blob = _ESPNFITT_RE.search(roster_source)
+    if blob is None:
+        return None
+    try:
+        roster = _json_loads(blob.group(1))['page']['content']['roster']
+    except (ValueError, KeyError, TypeError):
+        return None
+    player_dict = dict()
+    for group in roster.get('groups', [roster]):
+        for athlete in group.get('athletes', []):
+            record = dict(athlete)
+            name = record.pop('name', None)
+            if name:
+                player_dict[name] = record
+    return player_dict
 
 # This method gets a dictionary of player information from a given roster URL
-def get_player_info(roster_url):
-    f = urllib.request.urlopen(roster_url)
-    roster_source = f.read().decode('utf-8')
-    sleep(0.5)
-    player_regex = ('\{\"name\"\:\"(\w+\s\w+)\",\"href\"\:\"https?\://www\.espn\.com/nba/player/.*?\",(.*?)\}')
-    player_info = re.findall(player_regex, roster_source)
+async def get_player_info(client, roster_url):
+    roster_source = (await client.get(roster_url)).text
+    player_dict = parse_roster_json(roster_source)
+    if player_dict:
+        return player_dict
+    # fall back to the old per-player regex if ESPN moves the JSON blob
+    player_info = _PLAYER_RE.findall(roster_source)
     player_dict = dict()
     for player in player_info:
         player_dict[player[0]] = json.loads("{"+player[1]+"}")
     return(player_dict)
 
-# scrape player information from rosters
-rosters = build_team_urls()
-all_players = dict()
-for team in rosters.keys():
-    print("Gathering player info for team: " + team)
-    all_players[team] = get_player_info(rosters[team])
+# This method fetches a player's career stats from ESPN's JSON stats API.
+# The API response is ~10 KB against the ~500 KB HTML stats page, and the
+# Career row comes back as structured data instead of needing a regex.
+async def fetch_career_stats(client, player_id):
+    url = ("https://site.web.api.espn.com/apis/common/v3/sports/basketball/nba/athletes/"
+           + str(player_id) + "/stats")
+    data = (await client.get(url)).json()
+    for category in data.get('categories', []):
+        for row in category.get('statistics', []):
+            # the career entry is the row not tied to a single season
+            if row.get('type') == 'career' or 'season' not in row:
+                return row.get('stats')
+    return None
 
-# loop through each team, create a pandas DataFrame, and append
-all_players_df = pd.DataFrame()
-for team in all_players.keys():
-    team_df = pd.DataFrame.from_dict(all_players[team], orient = "index")
-    team_df['team'] = team
-    all_players_df = all_players_df.append(team_df)
-all_players_df.to_csv("NBA_roster_info_all_players.csv")
+async def main():
+    # a single HTTP/2 connection multiplexes all of the concurrent GETs,
+    # so the limits mostly matter if ESPN falls back to HTTP/1.1.
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+    headers = {'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'gzip, deflate'}
+    async with httpx.AsyncClient(http2=True, limits=limits, headers=headers,
+                                 timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
+        # scrape player information from rosters, fetching the pages concurrently
+        rosters = await build_team_urls(client)
+        print("Gathering player info for " + str(len(rosters)) + " teams...")
+        roster_results = await asyncio.gather(
+            *[get_player_info(client, url) for url in rosters.values()])
+        all_players = dict(zip(rosters.keys(), roster_results))
 
-# scrape career statistics
-print ("Now gathering career stats on all players (may take a while):")
-career_stats_df = pd.DataFrame(columns = ["GP","GS","MIN","FGM", "FGA","FG%","3PTM","3PTA","3P%","FTM","FTA","FT%","OR","DR","REB","AST","BLK","STL","PF","TO","PTS"])
-for player_index in all_players_df.index:
-    url = "https://www.espn.com/nba/player/stats/_/id/" + str(all_players_df.loc[player_index]['id'])
-    f = urllib.request.urlopen(url)
-    sleep(0.3)
-    player_source = f.read().decode('utf-8')
-    # extract career stats using this regex
-    stats_regex = ('\[\"Career\",\"\",(.*?)\]\},\{\"ttl\"\:\"Regular Season Totals\"')
-    career_info = re.findall(stats_regex, player_source)
-    try:
-        # convert the stats to a list of floats, and add the entry to the DataFrame
-        career_info = career_info[0].replace("\"", "").split(",")
-        career_info = list(chain.from_iterable([i.split("-") for i in career_info]))
-        career_info = list(map(float,career_info))
-        career_stats_df = career_stats_df.append(pd.Series(career_info, index = career_stats_df.columns, name=player_index))
-    except:
-        # if no career stats were returned, the player was a rookie with no games played
-        print(player_index + " has no info, ", end = "")
-career_stats_df.to_csv("NBA_player_career_stats_all_players.csv")
+        # build a DataFrame per team, then concatenate them all at once rather
+        # than re-copying the accumulated frame on every append
+        team_frames = []
+        for team in all_players.keys():
+            team_df = pd.DataFrame.from_dict(all_players[team], orient = "index")
+            team_df['team'] = team
+            team_frames.append(team_df)
+        all_players_df = pd.concat(team_frames)
+        all_players_df.to_csv("NBA_roster_info_all_players.csv")
+
+        # scrape career statistics, again with all fetches in flight at once
+        print ("Now gathering career stats on all players (may take a while):")
+        career_results = await asyncio.gather(
+            *[fetch_career_stats(client, player_id) for player_id in all_players_df['id']])
+
+    stat_columns = ["GP","GS","MIN","FGM", "FGA","FG%","3PTM","3PTA","3P%","FTM","FTA","FT%","OR","DR","REB","AST","BLK","STL","PF","TO","PTS"]
+    # write each 21-float career line straight into one preallocated array;
+    # players without stats keep their row of NaNs
+    career_stats = np.full((len(all_players_df), len(stat_columns)), np.nan, dtype = np.float32)
+    for row, (player_index, career_info) in enumerate(zip(all_players_df.index, career_results)):
+        try:
+            # split combined "made-attempted" values and convert to floats
+            career_info = list(chain.from_iterable([str(i).split("-") for i in career_info]))
+            career_stats[row, :] = career_info
+        except:
+            # if no career stats were returned, the player was a rookie with no games played
+            print(player_index + " has no info, ", end = "")
+    # wrap the array in a DataFrame without copying it again
+    career_stats_df = pd.DataFrame(career_stats, index = all_players_df.index, columns = stat_columns)
+    career_stats_df.to_csv("NBA_player_career_stats_all_players.csv")
+
+    # join and clean the data, using vectorized string ops instead of
+    # looping over the rows in Python
+    all_stats_df = all_players_df.join(career_stats_df)
+    height = all_stats_df['height'].str.extract(r"(\d+)'\s*(\d+)\"")
+    all_stats_df['height'] = height[0].astype(float)*12 + height[1].astype(float)
+    all_stats_df['weight'] = all_stats_df['weight'].str.split().str[0].astype(float)
+    all_stats_df['salary'] = all_stats_df['salary'].astype(str).str.replace(r'[^\d.]+', '', regex=True).replace('', pd.NA).astype('Float64')
 
-# join and clean the data
-all_stats_df = all_players_df.join(career_stats_df)
-def convert_height(height):
-    split_height = height.split(" ")
-    feet = float(split_height[0].replace("\'",""))
-    inches = float(split_height[1].replace("\"",""))
-    return (feet*12 + inches)
-all_stats_df['height'] = [convert_height(x) for x in all_stats_df['height']]
-all_stats_df['weight'] = [float(x.split(" ")[0]) for x in all_stats_df['weight']]
-all_stats_df['salary'] = [int(re.sub(r'[^\d.]+', '', s)) if isinstance(s, str) else s for s in all_stats_df['salary'].values]
+    all_stats_df.to_csv("NBA_player_info_and_stats_joined_clean.csv")
 
-all_stats_df.to_csv("NBA_player_info_and_stats_joined_clean.csv")
+asyncio.run(main())